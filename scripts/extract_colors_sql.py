@@ -6,11 +6,34 @@ prints SQL that can be applied via MCP.
 import io
 import json
 import sys
-from urllib.request import urlopen, Request
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from colorthief import ColorThief
+from PIL import Image
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).parent
+MAX_WORKERS = 32   # concurrent art downloads
+
+# One keep-alive session shared by all workers (TLS handshake paid once per pooled connection)
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'Mozilla/5.0'})
+SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+
+# MMCQ runs over every pixel; the dominant color survives downsampling, so
+# feed ColorThief a small thumbnail instead of the full-size album art
+THUMBNAIL_SIZE = (64, 64)
+
+def dominant_color_hex(img_bytes: bytes) -> str:
+    """Run ColorThief on a thumbnail of the image; returns '#rrggbb'."""
+    img = Image.open(io.BytesIO(img_bytes)).convert('RGBA')
+    img.thumbnail(THUMBNAIL_SIZE, Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, 'PNG')
+    buf.seek(0)
+    r, g, b = ColorThief(buf).get_color(quality=1)
+    return f'#{r:02x}{g:02x}{b:02x}'
 
 def load_env():
     env_file = SCRIPT_DIR.parent / '.env.local'
@@ -32,34 +55,37 @@ def main():
         sys.exit(1)
 
     api_url = f"{sb_url}/rest/v1/music_tracks?select=spotify_track_id,title,artist_name,album_image_url&order=artist_name,title"
-    req = Request(api_url, headers={
+    resp = SESSION.get(api_url, headers={
         'apikey': sb_key,
         'Authorization': f'Bearer {sb_key}',
     })
-    with urlopen(req) as resp:
-        tracks = json.loads(resp.read().decode())
+    resp.raise_for_status()
+    tracks = resp.json()
 
     print(f"-- Extracting dominant colors for {len(tracks)} tracks", file=sys.stderr)
 
-    results = []
-    for i, t in enumerate(tracks):
+    def process_one(item):
+        """Download art and extract its color. Returns a result tuple or None."""
+        i, t = item
         sid = t['spotify_track_id']
         art_url = t.get('album_image_url')
         if not art_url:
             print(f"[{i+1}/{len(tracks)}] SKIP (no art): {t.get('artist_name')} - {t.get('title')}", file=sys.stderr)
-            continue
+            return None
 
         try:
-            req = Request(art_url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urlopen(req, timeout=15) as resp:
-                img_bytes = resp.read()
-            ct = ColorThief(io.BytesIO(img_bytes))
-            r, g, b = ct.get_color(quality=1)
-            color = f'#{r:02x}{g:02x}{b:02x}'
-            results.append((sid, color, t.get('artist_name', '?'), t.get('title', '?')))
+            resp = SESSION.get(art_url, timeout=15)
+            resp.raise_for_status()
+            color = dominant_color_hex(resp.content)
             print(f"[{i+1}/{len(tracks)}] {t.get('artist_name')} - {t.get('title')} -> {color}", file=sys.stderr)
+            return (sid, color, t.get('artist_name', '?'), t.get('title', '?'))
         except Exception as e:
             print(f"[{i+1}/{len(tracks)}] ERROR: {t.get('artist_name')} - {t.get('title')}: {e}", file=sys.stderr)
+            return None
+
+    # Network-bound: overlap the art downloads across threads (results keep catalog order)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        results = [r for r in ex.map(process_one, enumerate(tracks)) if r is not None]
 
     # Output as JSON for easy parsing
     output = []
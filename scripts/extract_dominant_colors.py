@@ -2,7 +2,7 @@
 Extract dominant color from Spotify album art thumbnails.
 
 Fetches album_image_url for each track in the catalog, runs ColorThief
-to find the dominant color, and updates the music_tracks table in Supabase.
+to find the dominant color, and bulk-upserts it into the music_tracks table in Supabase.
 
 Usage:
   python scripts/extract_dominant_colors.py              # all tracks
@@ -14,15 +14,38 @@ Output: Updates music_tracks.dominant_color with hex strings like '#cc44aa'
 
 import argparse
 import io
-import json
-import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.request import urlopen, Request
 
+import requests
 from colorthief import ColorThief
+from PIL import Image
 
 SCRIPT_DIR = Path(__file__).parent
+MAX_WORKERS = 32   # concurrent art downloads / fallback DB updates
+UPSERT_CHUNK = 500 # rows per bulk upsert request
+
+# One keep-alive session shared by all workers, so the TLS handshake to the art
+# CDN / Supabase is paid once per pooled connection rather than once per request
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'Mozilla/5.0'})
+SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+
+# MMCQ runs over every pixel; the dominant color survives downsampling, so
+# feed ColorThief a small thumbnail instead of the full-size album art
+THUMBNAIL_SIZE = (64, 64)
+
+def dominant_color_hex(img_bytes: bytes) -> str:
+    """Run ColorThief on a thumbnail of the image; returns '#rrggbb'."""
+    img = Image.open(io.BytesIO(img_bytes)).convert('RGBA')
+    img.thumbnail(THUMBNAIL_SIZE, Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, 'PNG')
+    buf.seek(0)
+    r, g, b = ColorThief(buf).get_color(quality=1)
+    return f'#{r:02x}{g:02x}{b:02x}'
 
 # Load Supabase credentials from .env.local
 def load_env():
@@ -39,45 +62,57 @@ def load_env():
 
 def fetch_tracks_from_supabase(url: str, anon_key: str) -> list:
     """Fetch all tracks with album_image_url from Supabase."""
-    api_url = f"{url}/rest/v1/music_tracks?select=spotify_track_id,title,artist_name,album_image_url,dominant_color&order=title"
-    req = Request(api_url, headers={
+    api_url = f"{url}/rest/v1/music_tracks?select=spotify_track_id,spotify_artist_id,title,artist_name,album_image_url,dominant_color&order=title"
+    resp = SESSION.get(api_url, headers={
         'apikey': anon_key,
         'Authorization': f'Bearer {anon_key}',
     })
-    with urlopen(req) as resp:
-        return json.loads(resp.read().decode())
+    resp.raise_for_status()
+    return resp.json()
 
 
 def update_dominant_color(url: str, anon_key: str, spotify_track_id: str, color: str) -> bool:
     """Update dominant_color for a track in Supabase."""
     import urllib.parse
     api_url = f"{url}/rest/v1/music_tracks?spotify_track_id=eq.{urllib.parse.quote(spotify_track_id)}"
-    data = json.dumps({'dominant_color': color}).encode()
-    req = Request(api_url, data=data, method='PATCH', headers={
-        'apikey': anon_key,
-        'Authorization': f'Bearer {anon_key}',
-        'Content-Type': 'application/json',
-        'Prefer': 'return=minimal',
-    })
     try:
-        with urlopen(req) as resp:
-            return resp.status in (200, 204)
+        resp = SESSION.patch(api_url, json={'dominant_color': color}, headers={
+            'apikey': anon_key,
+            'Authorization': f'Bearer {anon_key}',
+            'Prefer': 'return=minimal',
+        })
+        resp.raise_for_status()
+        return resp.status_code in (200, 204)
     except Exception as e:
         print(f"    UPDATE ERROR: {e}")
         return False
 
 
+def upsert_dominant_colors(url: str, anon_key: str, rows: list) -> bool:
+    """
+    Bulk-upsert dominant_color for many tracks in one request (merge on spotify_track_id).
+    Rows carry the NOT NULL columns too, since Postgres checks them before ON CONFLICT.
+    """
+    api_url = f"{url}/rest/v1/music_tracks?on_conflict=spotify_track_id"
+    try:
+        resp = SESSION.post(api_url, json=rows, headers={
+            'apikey': anon_key,
+            'Authorization': f'Bearer {anon_key}',
+            'Prefer': 'resolution=merge-duplicates,return=minimal',
+        })
+        resp.raise_for_status()
+        return resp.status_code in (200, 201, 204)
+    except Exception as e:
+        print(f"    UPSERT ERROR: {e}")
+        return False
+
+
 def extract_dominant_color(image_url: str) -> str | None:
     """Download image and extract dominant color as hex string."""
     try:
-        req = Request(image_url, headers={
-            'User-Agent': 'Mozilla/5.0',
-        })
-        with urlopen(req, timeout=15) as resp:
-            img_bytes = resp.read()
-        ct = ColorThief(io.BytesIO(img_bytes))
-        r, g, b = ct.get_color(quality=1)
-        return f'#{r:02x}{g:02x}{b:02x}'
+        resp = SESSION.get(image_url, timeout=15)
+        resp.raise_for_status()
+        return dominant_color_hex(resp.content)
     except Exception as e:
         print(f"    EXTRACT ERROR: {e}")
         return None
@@ -105,37 +140,56 @@ def main():
     failed = 0
     no_art = 0
 
+    pending = []
     for i, t in enumerate(tracks):
-        sid = t['spotify_track_id']
-        title = t.get('title', '?')
-        artist = t.get('artist_name', '?')
-        art_url = t.get('album_image_url')
-        existing = t.get('dominant_color')
-
-        if existing and not args.force:
+        if t.get('dominant_color') and not args.force:
             skipped += 1
             continue
-
-        if not art_url:
+        if not t.get('album_image_url'):
             no_art += 1
             continue
-
-        print(f"[{i+1}/{len(tracks)}] {artist} - {title}")
-        color = extract_dominant_color(art_url)
-        if not color:
-            failed += 1
-            continue
-
-        print(f"    -> {color}")
-
-        if not args.dry_run:
-            ok = update_dominant_color(sb_url, sb_key, sid, color)
-            if ok:
-                success += 1
+        pending.append((i, t))
+
+    def process_one(item):
+        """Download art and extract its color."""
+        i, t = item
+        return i, t, extract_dominant_color(t['album_image_url'])
+
+    # Network-bound: overlap the art downloads across threads
+    extracted = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        for i, t, color in ex.map(process_one, pending):
+            print(f"[{i+1}/{len(tracks)}] {t.get('artist_name', '?')} - {t.get('title', '?')}"
+                  f" -> {color or 'FAILED'}")
+            if color:
+                extracted.append((t, color))
             else:
                 failed += 1
-        else:
-            success += 1
+
+    if args.dry_run:
+        success += len(extracted)
+    else:
+        print(f"\nWriting {len(extracted)} colors to Supabase...")
+        for start in range(0, len(extracted), UPSERT_CHUNK):
+            chunk = extracted[start:start + UPSERT_CHUNK]
+            rows = [{
+                'spotify_track_id': t['spotify_track_id'],
+                'spotify_artist_id': t.get('spotify_artist_id'),
+                'title': t.get('title'),
+                'artist_name': t.get('artist_name'),
+                'dominant_color': color,
+            } for t, color in chunk]
+            if upsert_dominant_colors(sb_url, sb_key, rows):
+                success += len(chunk)
+                continue
+            # Fall back to one PATCH per track (e.g. the key can UPDATE but not INSERT)
+            print(f"    bulk upsert failed, falling back to per-track updates")
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+                oks = list(ex.map(
+                    lambda tc: update_dominant_color(sb_url, sb_key, tc[0]['spotify_track_id'], tc[1]),
+                    chunk))
+            success += sum(oks)
+            failed += len(oks) - sum(oks)
 
     print(f"\n{'='*60}")
     print(f"Done! {success} extracted, {skipped} skipped, {failed} failed, {no_art} no art")
@@ -1,26 +1,29 @@
 """
 Batch Course Generator — generates Easy/Normal/Hard courses for ALL tracks.
 
-Reads all beat data files from public/beat_data/ and runs generate_courses.py
-for each track. Skips tracks that already have all 3 difficulty files.
+Reads all beat data files from public/beat_data/ and generates each track's
+courses with generate_courses.generate_all_difficulties(), fanned out over a
+process pool. Skips tracks that already have all 3 difficulty files.
 
 Usage:
   python scripts/generate_all_courses.py
   python scripts/generate_all_courses.py --force          # regenerate all
   python scripts/generate_all_courses.py --max-attempts 30
   python scripts/generate_all_courses.py --target-score 9.0
+  python scripts/generate_all_courses.py --jobs 4         # worker processes (default: all cores)
 """
 
-import json
 import os
-import subprocess
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+# Run as `python scripts/generate_all_courses.py`, so scripts/ is on sys.path
+from generate_courses import DIFFICULTIES, generate_all_difficulties
+
 BEAT_DIR = Path('public/beat_data')
 OUTPUT_DIR = Path('public/courses')
-DIFFICULTIES = ['easy', 'normal', 'hard']
 
 
 def main():
@@ -33,6 +36,8 @@ def main():
     parser.add_argument('--target-score', type=float, default=9.60,
                         help='Target quality score')
     parser.add_argument('--verbose', '-v', action='store_true')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='Tracks to generate in parallel (default: CPU count)')
     args = parser.parse_args()
 
     # Find all beat data files
@@ -46,71 +51,52 @@ def main():
     print(f"Force regenerate: {args.force}")
     print()
 
-    total = len(beat_files)
     skipped = 0
     generated = 0
     failed = 0
     scores = []
     start_time = time.time()
 
-    for i, bf in enumerate(beat_files, 1):
+    pending = []
+    for bf in beat_files:
         track_id = bf.stem
         course_dir = OUTPUT_DIR / track_id
 
         # Check if all difficulties already exist
         if not args.force:
-            existing = [d for d in DIFFICULTIES if (course_dir / f'{d}.json').exists()]
+            # One directory scan instead of a stat() per difficulty file
+            names = {e.name for e in os.scandir(course_dir)} if course_dir.is_dir() else set()
+            existing = [d for d in DIFFICULTIES if f'{d}.json' in names]
             if len(existing) == 3:
                 skipped += 1
                 continue
 
-        print(f"[{i}/{total}] {track_id}")
-
-        try:
-            cmd = [
-                sys.executable, 'scripts/generate_courses.py',
-                '--track', track_id,
-                '--all-difficulties',
-                '--max-attempts', str(args.max_attempts),
-                '--target-score', str(args.target_score),
-            ]
-            if args.verbose:
-                cmd.append('--verbose')
-
-            result = subprocess.run(
-                cmd, capture_output=True, text=True, timeout=300
-            )
-
-            if result.returncode != 0:
-                print(f"  FAILED: {result.stderr.strip()[:200]}")
+        pending.append(track_id)
+
+    # CPU-bound and independent per track: one worker process per core
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+        futures = {
+            ex.submit(generate_all_difficulties, track_id,
+                      max_attempts=args.max_attempts,
+                      target_score=args.target_score,
+                      beat_dir=BEAT_DIR, output_dir=OUTPUT_DIR,
+                      verbose=args.verbose, force=args.force): track_id
+            for track_id in pending
+        }
+        for done, fut in enumerate(as_completed(futures), 1):
+            track_id = futures[fut]
+            try:
+                track_scores = {d: sc['total'] for d, sc in fut.result().items()}
+            except Exception as e:
+                print(f"[{done}/{len(pending)}] {track_id}  ERROR: {e}")
                 failed += 1
                 continue
 
-            # Read back scores from generated files
-            track_scores = {}
-            for diff in DIFFICULTIES:
-                course_file = course_dir / f'{diff}.json'
-                if course_file.exists():
-                    with open(course_file) as f:
-                        data = json.load(f)
-                    track_scores[diff] = data['score']['total']
-
-            if track_scores:
-                avg = sum(track_scores.values()) / len(track_scores)
-                scores.append(avg)
-                score_str = '  '.join(f"{d}={track_scores.get(d, 0):.2f}" for d in DIFFICULTIES)
-                print(f"  OK: {score_str}  (avg={avg:.2f})")
-                generated += 1
-            else:
-                print(f"  WARN: No output files found")
-                failed += 1
-
-        except subprocess.TimeoutExpired:
-            print(f"  TIMEOUT (>300s)")
-            failed += 1
-        except Exception as e:
-            print(f"  ERROR: {e}")
-            failed += 1
+            avg = sum(track_scores.values()) / len(track_scores)
+            scores.append(avg)
+            score_str = '  '.join(f"{d}={track_scores.get(d, 0):.2f}" for d in DIFFICULTIES)
+            print(f"[{done}/{len(pending)}] {track_id}  OK: {score_str}  (avg={avg:.2f})")
+            generated += 1
 
     elapsed = time.time() - start_time
     print()
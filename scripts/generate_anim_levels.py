@@ -1,26 +1,40 @@
 """
 Generate multi-resolution title animation frames for A/B testing.
 
-Creates 49 resolution levels (L01-L49) from original 1920x1080 frames
-using nearest-neighbor downscaling. Originals stay untouched as L00.
+Creates 49 resolution levels (L01-L49) from original 1920x1080 frames.
+Each frame is decoded once at full size and box-filtered into 2x mips
+(Image.reduce); every level is a final NEAREST resize from the smallest
+mip that covers it. Originals stay untouched as L00.
+Re-runs skip levels already generated from the same sources and settings
+(tracked by a .done.json in each level folder).
 
 Linear 2% steps: scale(level) = 1.0 - level * 0.02
   L00 = 1920x1080 (original)
   L25 = 960x540
   L49 = 38x22
 
+Requires stock Pillow (its wheels bundle libjpeg-turbo). pillow-simd buys
+nothing here: it vectorizes the convolution resize filters and color
+conversion, while this script only uses reduce(), NEAREST and the JPEG codec.
+
 Usage:
   python scripts/generate_anim_levels.py
   python scripts/generate_anim_levels.py --quality 80
+  python scripts/generate_anim_levels.py --fast-encode    # skip the Huffman pass (~2x faster, ~12% larger)
+  python scripts/generate_anim_levels.py --progressive    # progressive scans (~1% smaller, ~2x slower encode)
   python scripts/generate_anim_levels.py --single-level 25
   python scripts/generate_anim_levels.py --dry-run
+  python scripts/generate_anim_levels.py --force        # regenerate levels that are already up to date
+  python scripts/generate_anim_levels.py --jobs 4      # limit parallel workers
 """
 
 import argparse
+import io
 import json
 import os
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 try:
@@ -29,6 +43,11 @@ except ImportError:
     print("ERROR: Pillow not installed. Run: pip install Pillow")
     sys.exit(1)
 
+try:
+    import orjson  # optional, faster manifest serialization
+except ImportError:
+    orjson = None
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent / "public" / "assets" / "start"
 
@@ -46,6 +65,12 @@ ANIMATIONS = [
 ]
 
 TOTAL_LEVELS = 49  # L01 through L49 (L00 = originals)
+PREFETCH_THREADS = 4  # source frame reads kept in flight ahead of the encoders
+IMAGE_BLOCKS_MAX = 16  # Pillow memory blocks each worker keeps for reuse
+DONE_FILE = ".done.json"  # per-level shard: settings, sources and frame sizes
+# Recorded in the manifest and every .done.json, so levels made with a
+# different filter (e.g. the old plain NEAREST) are never compared as equal
+RESAMPLING = "full decode, box 2x mips, NEAREST final"
 
 
 def calc_dimensions(level: int, orig_w: int = 1920, orig_h: int = 1080) -> tuple[int, int]:
@@ -61,8 +86,106 @@ def calc_dimensions(level: int, orig_w: int = 1920, orig_h: int = 1080) -> tuple
     return w, h
 
 
-def process_animation(anim: dict, levels: list[int], quality: int, dry_run: bool) -> list[dict]:
-    """Process one animation set (e.g., start_loop) across all requested levels."""
+# Every level's (w, h), computed once; calc_dimensions stays the single rounding rule.
+# Each 2% step is at least 38x22 px, so all 49 sizes are distinct and every
+# level is encoded on its own (no shared or linked frames between folders)
+DIMS = {level: calc_dimensions(level) for level in range(1, TOTAL_LEVELS + 1)}
+
+
+def jpeg_save_options(quality: int, fast: bool = False, progressive: bool = False) -> dict:
+    """
+    Pillow save() kwargs for every output frame. Pillow's JPEG codec is
+    libjpeg-turbo, so the SIMD encoder is already in use; optimize=True adds a
+    second Huffman pass (~1.9x encode time) that saves ~12% on these frames.
+    No exif/icc_profile is passed, so outputs carry no source metadata.
+    Baseline stays the default: frames are decoded whole into textures, where
+    progressive scans only add decode cost for ~1% fewer bytes.
+    """
+    return {"quality": quality, "subsampling": "4:2:0", "optimize": not fast, "progressive": progressive}
+
+
+def write_json(path: Path, obj: dict):
+    """Indented JSON write (orjson when available)."""
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w") as f:
+            json.dump(obj, f, indent=2)
+
+
+def read_done(out_dir: Path, w: int, h: int, save_opts: dict, sources: dict) -> dict | None:
+    """
+    Per-frame sizes from a level's .done.json if that level is up to date:
+    same dimensions, resampling and encoder settings, same source files
+    (mtime + size), and every frame still on disk. Otherwise None.
+    """
+    try:
+        done = json.loads((out_dir / DONE_FILE).read_bytes())
+    except (OSError, ValueError):
+        return None
+    if (done.get("width"), done.get("height")) != (w, h) or done.get("resampling") != RESAMPLING \
+            or done.get("save_opts") != save_opts or done.get("sources") != sources:
+        return None
+    names = {e.name for e in os.scandir(out_dir)}
+    if not all(name in names for name in sources):
+        return None
+    return done["frames"]
+
+
+def _init_worker():
+    """
+    Pool initializer. Pillow frees image memory straight back to malloc by
+    default; keep a few blocks cached so each frame's decode, mips and resized
+    levels reuse the previous frame's buffers instead of reallocating them.
+    """
+    Image.core.set_blocks_max(IMAGE_BLOCKS_MAX)
+
+
+def _build_mips(data: bytes, min_w: int, min_h: int) -> list:
+    """
+    Mip chain for one frame, largest first: one full-size decode, then box
+    halving while the result still covers (min_w, min_h). Always starting from
+    the full decode keeps a level's pixels independent of which levels are
+    requested alongside it.
+    """
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    mips = [img]
+    while (mips[-1].width + 1) // 2 >= min_w and (mips[-1].height + 1) // 2 >= min_h:
+        mips.append(mips[-1].reduce(2))
+    return mips
+
+
+def _process_frame(data: bytes, targets: list[tuple[Path, int, int]], save_opts: dict) -> list[int]:
+    """
+    Pool worker: write every (dst_file, w, h) level of one source frame's JPEG bytes.
+    Decodes once into a mip chain; each level resamples from the smallest mip
+    that covers it. Returns bytes written per target.
+    """
+    mips = _build_mips(data, min(w for _, w, _ in targets), min(h for _, _, h in targets))
+    sizes = []
+    for dst_file, w, h in targets:
+        src = next(m for m in reversed(mips) if m.width >= w and m.height >= h)
+        # Pillow's NEAREST pretabulates its column index table in C and stays
+        # the fastest option measured: a NumPy gather over the same tables is
+        # 2-4x slower, fast_image_resize (cykooz.resizer) and a numba kernel
+        # only win on packed RGBX pixels, and converting to RGBX and encoding
+        # from it costs more than they save
+        resized = src.resize((w, h), Image.NEAREST)
+        # Encode in memory and hand the OS one write per file instead of
+        # libjpeg's stream of small buffer flushes
+        buf = io.BytesIO()
+        resized.save(buf, "JPEG", **save_opts)
+        sizes.append(dst_file.write_bytes(buf.getbuffer()))
+    return sizes
+
+
+def process_animation(anim: dict, levels: list[int], save_opts: dict, dry_run: bool,
+                      executor: ProcessPoolExecutor, force: bool = False) -> list[dict]:
+    """
+    Process one animation set (e.g., start_loop) across all requested levels.
+    Levels whose .done.json shows they are up to date are skipped unless force.
+    """
     src_dir = BASE_DIR / anim["name"]
     if not src_dir.exists():
         print(f"  ERROR: Source dir not found: {src_dir}")
@@ -70,12 +193,10 @@ def process_animation(anim: dict, levels: list[int], quality: int, dry_run: bool
 
     results = []
 
-    for level in levels:
-        w, h = calc_dimensions(level)
-        folder_name = f"{anim['name']}_L{level:02d}"
-        out_dir = BASE_DIR / folder_name
-
-        if dry_run:
+    if dry_run:
+        for level in levels:
+            w, h = DIMS[level]
+            folder_name = f"{anim['name']}_L{level:02d}"
             vram_mb = w * h * 4 * anim["count"] / 1024 / 1024
             print(f"  L{level:02d}: {w:4d}x{h:4d} | ~{vram_mb:6.1f} MB VRAM | -> {folder_name}/")
             results.append({
@@ -85,25 +206,63 @@ def process_animation(anim: dict, levels: list[int], quality: int, dry_run: bool
                 "folder": folder_name,
                 "vram_mb": round(vram_mb, 1),
             })
+        return results
+
+    # Source fingerprint (mtime + size) for the resumability check
+    frames, sources = [], {}
+    for i in range(anim["count"]):
+        name = f"{anim['prefix']}{i:02d}.jpg"
+        try:
+            st = (src_dir / name).stat()
+        except FileNotFoundError:
+            print(f"  WARNING: Missing {src_dir / name}")
             continue
+        frames.append(name)
+        sources[name] = [st.st_mtime_ns, st.st_size]
 
+    out_dirs, dims, frame_sizes = [], [], []
+    for level in levels:
+        out_dir = BASE_DIR / f"{anim['name']}_L{level:02d}"
         out_dir.mkdir(parents=True, exist_ok=True)
-        total_bytes = 0
-
-        for i in range(anim["count"]):
-            idx = f"{i:02d}"
-            src_file = src_dir / f"{anim['prefix']}{idx}.jpg"
-            dst_file = out_dir / f"{anim['prefix']}{idx}.jpg"
-
-            if not src_file.exists():
-                print(f"  WARNING: Missing {src_file}")
-                continue
-
-            img = Image.open(src_file)
-            resized = img.resize((w, h), Image.NEAREST)
-            resized.save(dst_file, "JPEG", quality=quality, optimize=True)
-            total_bytes += dst_file.stat().st_size
+        w, h = DIMS[level]
+        out_dirs.append(out_dir)
+        dims.append((w, h))
+        frame_sizes.append(None if force else read_done(out_dir, w, h, save_opts, sources))
+    pending = [i for i, sizes in enumerate(frame_sizes) if sizes is None]
+    for i in pending:
+        (out_dirs[i] / DONE_FILE).unlink(missing_ok=True)
+        frame_sizes[i] = {}
+
+    # One CPU-bound task per source frame (decoded once, encoded at every
+    # pending level), fanned out to the process pool.
+    # Source files are read ahead on a few I/O threads, and each frame is
+    # submitted as soon as its bytes arrive, so workers never wait on disk.
+    if pending:
+        targets = [[(out_dirs[i] / name, *dims[i]) for i in pending] for name in frames]
+        with ThreadPoolExecutor(max_workers=PREFETCH_THREADS) as io_pool:
+            src_data = io_pool.map(Path.read_bytes, [src_dir / name for name in frames])
+            for name, sizes in zip(frames, executor.map(_process_frame, src_data, targets,
+                                                        [save_opts] * len(frames))):
+                for i, size in zip(pending, sizes):
+                    frame_sizes[i][name] = size
+
+    for i in pending:
+        # Written last, so an interrupted run leaves the level pending
+        write_json(out_dirs[i] / DONE_FILE, {
+            "width": dims[i][0],
+            "height": dims[i][1],
+            "resampling": RESAMPLING,
+            "save_opts": save_opts,
+            "sources": sources,
+            "frames": frame_sizes[i],
+        })
+    bytes_by_level = {level: sum(sizes.values()) for level, sizes in zip(levels, frame_sizes)}
+    skipped = {levels[i] for i in range(len(levels)) if i not in pending}
 
+    for level in levels:
+        w, h = DIMS[level]
+        folder_name = f"{anim['name']}_L{level:02d}"
+        total_bytes = bytes_by_level[level]
         avg_bytes = total_bytes // anim["count"] if anim["count"] > 0 else 0
         vram_mb = w * h * 4 * anim["count"] / 1024 / 1024
 
@@ -117,7 +276,8 @@ def process_animation(anim: dict, levels: list[int], quality: int, dry_run: bool
             "vram_mb": round(vram_mb, 1),
         })
 
-        print(f"  L{level:02d}: {w:4d}x{h:4d} | {total_bytes // 1024:6d} KB | avg {avg_bytes // 1024:5d} KB/frame | ~{vram_mb:.1f} MB VRAM")
+        print(f"  L{level:02d}: {w:4d}x{h:4d} | {total_bytes // 1024:6d} KB | avg {avg_bytes // 1024:5d} KB/frame | ~{vram_mb:.1f} MB VRAM"
+              + (" | up to date" if level in skipped else ""))
 
     return results
 
@@ -125,9 +285,16 @@ def process_animation(anim: dict, levels: list[int], quality: int, dry_run: bool
 def main():
     parser = argparse.ArgumentParser(description="Generate multi-resolution animation levels")
     parser.add_argument("--quality", type=int, default=85, help="JPEG quality (default: 85)")
+    parser.add_argument("--fast-encode", action="store_true",
+                        help="Skip optimized Huffman coding (faster, larger files)")
+    parser.add_argument("--progressive", action="store_true",
+                        help="Write progressive JPEGs (slightly smaller, slower to encode/decode)")
     parser.add_argument("--single-level", type=int, default=None, help="Generate only one level (1-49)")
     parser.add_argument("--dry-run", action="store_true", help="Preview dimensions only, no files")
+    parser.add_argument("--force", action="store_true", help="Regenerate levels even if up to date")
     parser.add_argument("--skip-start-play", action="store_true", help="Only process start_loop")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Parallel encode workers (default: CPU count)")
     args = parser.parse_args()
 
     # Determine which levels to generate
@@ -141,17 +308,21 @@ def main():
         anims_to_process = [ANIMATIONS[0]]
 
     print(f"{'[DRY RUN] ' if args.dry_run else ''}Generating {len(levels)} level(s) for {len(anims_to_process)} animation(s)")
-    print(f"JPEG quality: {args.quality} | Resampling: NEAREST")
+    save_opts = jpeg_save_options(args.quality, fast=args.fast_encode, progressive=args.progressive)
+    print(f"JPEG quality: {args.quality} | Optimized Huffman: {save_opts['optimize']} | "
+          f"Progressive: {save_opts['progressive']} | Resampling: {RESAMPLING}")
     print(f"Output base: {BASE_DIR}\n")
 
-    manifest = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "quality": args.quality, "animations": {}}
+    manifest = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "quality": args.quality,
+                "resampling": RESAMPLING, "animations": {}}
     start_time = time.time()
 
-    for anim in anims_to_process:
-        print(f"=== {anim['name']} ({anim['count']} frames) ===")
-        results = process_animation(anim, levels, args.quality, args.dry_run)
-        manifest["animations"][anim["name"]] = results
-        print()
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=_init_worker) as executor:
+        for anim in anims_to_process:
+            print(f"=== {anim['name']} ({anim['count']} frames) ===")
+            results = process_animation(anim, levels, save_opts, args.dry_run, executor, args.force)
+            manifest["animations"][anim["name"]] = results
+            print()
 
     elapsed = time.time() - start_time
     print(f"Done in {elapsed:.1f}s")
@@ -159,8 +330,7 @@ def main():
     # Write manifest
     if not args.dry_run:
         manifest_path = BASE_DIR / "anim_levels_manifest.json"
-        with open(manifest_path, "w") as f:
-            json.dump(manifest, f, indent=2)
+        write_json(manifest_path, manifest)
         print(f"Manifest written to: {manifest_path}")
 
 